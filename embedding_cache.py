@@ -0,0 +1,81 @@
+# embedding_cache.py
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+EMBEDDING_CACHE_SIZE = 20_000  # about 60 MB of float16 at 1536 dims
+
+
+def _key(text: str, memory_action: Optional[str]) -> bytes:
+    # Some embedders embed differently per action, so it is part of the key.
+    return hashlib.blake2b(f"{memory_action}\0{text}".encode(), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """LRU in front of a mem0 embedder, keyed by a hash of the text.
+
+    Vectors are kept as float16, which halves their memory (about 3 KB per
+    1536-d embedding) at a precision well below what retrieval notices.
+
+    It replaces `Memory.embedding_model`, so mem0's own add and search calls
+    go through it too. Anything other than `embed` is forwarded to the
+    wrapped embedder. `embed` is called from threadpool threads, hence the
+    lock.
+    """
+
+    def __init__(self, embedder, maxsize: int = EMBEDDING_CACHE_SIZE, batch: bool = False):
+        self.embedder = embedder
+        self.maxsize = maxsize
+        # True when the embedder has an OpenAI client that accepts a list of inputs.
+        self.batch = batch
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+    def embed(self, text: str, memory_action: Optional[str] = None) -> List[float]:
+        key = _key(text, memory_action)
+        vector = self._get(key)
+        if vector is None:
+            vector = self.embedder.embed(text, memory_action)
+            self._put(key, vector)
+        return vector if isinstance(vector, list) else vector.tolist()
+
+    def embed_many(self, texts: List[str], memory_action: Optional[str] = None) -> List[List[float]]:
+        keys = [_key(text, memory_action) for text in texts]
+        vectors = [self._get(key) for key in keys]
+        misses = [i for i, vector in enumerate(vectors) if vector is None]
+        if len(misses) > 1 and self.batch:
+            # mem0's embedders only take one text at a time; the OpenAI API
+            # accepts a list, so send every miss in a single request.
+            response = self.embedder.client.embeddings.create(
+                input=[texts[i].replace("\n", " ") for i in misses],
+                model=self.embedder.config.model,
+                dimensions=self.embedder.config.embedding_dims,
+            )
+            fresh = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        else:
+            fresh = [self.embedder.embed(texts[i], memory_action) for i in misses]
+        for i, vector in zip(misses, fresh):
+            self._put(keys[i], vector)
+            vectors[i] = vector
+        return [vector if isinstance(vector, list) else vector.tolist() for vector in vectors]
+
+    def _get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def _put(self, key: bytes, vector: List[float]):
+        stored = np.asarray(vector, dtype=np.float16)
+        with self._lock:
+            self._entries[key] = stored
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
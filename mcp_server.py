@@ -1,120 +1,558 @@
 # mcp_server.py
 import os
-from fastapi import FastAPI, Body, HTTPException
-from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
-from mem0 import Memory
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from functools import partial
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Annotated, Dict, Any, List, Literal, Optional, Set, Tuple, Union
 import uvicorn
-from types import SimpleNamespace
+import sim_kernel
+from embedding_cache import EmbeddingCache
+from search_cache import SearchCache, normalize_query
+from tenant_index import TenantIndex
 
-# --- This helper is still needed for the nested vector_store config ---
-def dict_to_namespace(d):
-    if not isinstance(d, dict):
-        return d
-    converted_dict = {k: dict_to_namespace(v) for k, v in d.items()}
-    return SimpleNamespace(**converted_dict)
+# --- Logging ---
+# Handlers only enqueue records; a background thread does the actual write,
+# so request handlers never block on stdout (or Render's log pipe).
+logger = logging.getLogger("mcp")
+# `python mcp_server.py` imports this file twice (as __main__ and again as
+# mcp_server for uvicorn); the second import must not add another handler.
+if not logger.handlers:
+    _log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    _log_stream = logging.StreamHandler()
+    _log_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _log_listener = QueueListener(_log_queue, _log_stream)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    logger.addHandler(QueueHandler(_log_queue))
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logger.propagate = False
+
+# --- Input limits ---
+MAX_TEXT_LENGTH = 8000      # characters of content/query; well past one embedding
+MAX_USER_ID_LENGTH = 256
+# Checked against Content-Length before the body is read or parsed.
+MAX_BODY_BYTES = {
+    "/invoke": 64 * 1024,
+    "/invoke_batch": 1024 * 1024,
+}
 
 # --- Pydantic Models for Type Safety ---
-class MCPState(BaseModel):
-    user_id: Optional[str] = None
+class AddPayload(BaseModel):
+    action: Literal["add"]
+    user_id: str = Field(min_length=1, max_length=MAX_USER_ID_LENGTH)
+    content: str = Field(min_length=1, max_length=MAX_TEXT_LENGTH)
+
+class SearchPayload(BaseModel):
+    action: Literal["search"]
+    user_id: str = Field(min_length=1, max_length=MAX_USER_ID_LENGTH)
+    query: str = Field(min_length=1, max_length=MAX_TEXT_LENGTH)
+
+# `action` picks the model, so each shape is validated by pydantic-core alone.
+InvokePayload = Annotated[Union[AddPayload, SearchPayload], Field(discriminator="action")]
+
+# Same cap as the embedding batch size we send upstream in one request.
+MAX_BATCH_SIZE = 48
+
+class BatchInvoke(BaseModel):
+    items: List[InvokePayload] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+# --- Search result formatting ---
+# Matches `Memory.search` (v1.1 output) for callers that query the vector
+# store directly with a precomputed embedding.
+SEARCH_LIMIT = 100
+PROMOTED_PAYLOAD_KEYS = ("user_id", "agent_id", "run_id", "actor_id", "role")
+CORE_PAYLOAD_KEYS = {"data", "hash", "created_at", "updated_at", "id", *PROMOTED_PAYLOAD_KEYS}
+
+def format_memories(points) -> List[Dict[str, Any]]:
+    memories = []
+    for point in points:
+        memory = {
+            "id": point.id,
+            "memory": point.payload["data"],
+            "hash": point.payload.get("hash"),
+            "metadata": None,
+            "score": point.score,
+            "created_at": point.payload.get("created_at"),
+            "updated_at": point.payload.get("updated_at"),
+        }
+        for key in PROMOTED_PAYLOAD_KEYS:
+            if key in point.payload:
+                memory[key] = point.payload[key]
+        metadata = {k: v for k, v in point.payload.items() if k not in CORE_PAYLOAD_KEYS}
+        if metadata:
+            memory["metadata"] = metadata
+        memories.append(memory)
+    return memories
 
-class InvokePayload(BaseModel):
-    action: str
-    payload: Dict[str, Any] = Field(default_factory=dict)
+# --- Background adds ---
+# mem0.add runs an LLM fact-extraction round trip, so adds are queued and
+# applied by a background task instead of holding the request open.
+ADD_QUEUE_SIZE = 1024   # producers wait once this many adds are pending
+ADD_BATCH_SIZE = 8      # adds taken off the queue per threadpool hop
+ADD_DRAIN_TIMEOUT = 30  # seconds to finish queued adds on shutdown
+WARMUP_USER_ID = "__warmup__"
+
+# --- Search embeddings ---
+# Concurrent searches wait briefly for each other so that their queries reach
+# the embedder in one call instead of one call per search.
+EMBED_BATCH_SIZE = 32       # texts that end the wait early
+EMBED_BATCH_WINDOW = 0.01   # seconds to wait for more searches
+
+# --- Blocking work ---
+# mem0 calls (LLM, embedder, Qdrant) run on a dedicated pool so they never
+# compete with Starlette's own threadpool.
+MEM0_THREADS = 32
+
+# --- Upstream HTTP ---
+# mem0's OpenAI embedder and LLM share one pooled HTTP/2 client.
+HTTP_TIMEOUT = 30.0
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE = 50
+
+# --- Vector store connection ---
+# mem0 clears the qdrant-local folder on every start, so this is scratch space.
+DEFAULT_STORAGE_PATH = "/tmp/mem0_storage"
+
+# Set QDRANT_URL to talk to a Qdrant server instead of the embedded store.
+QDRANT_GRPC_PORT = 6334
+QDRANT_TIMEOUT = 5
+# gRPC caps messages at 4 MB by default; a full /invoke_batch response
+# (48 searches x SEARCH_LIMIT points with payloads) can go past that.
+QDRANT_GRPC_MAX_MESSAGE = 64 * 1024 * 1024
+
+def qdrant_store_config(storage_path: str) -> Dict[str, Any]:
+    url = os.getenv("QDRANT_URL")
+    if not url:
+        # qdrant-local runs in-process, so there is no transport to choose.
+        os.makedirs(storage_path, exist_ok=True)
+        return {"path": storage_path}
+
+    from qdrant_client import QdrantClient
+    client = QdrantClient(
+        url=url,
+        api_key=os.getenv("QDRANT_API_KEY"),
+        prefer_grpc=True,
+        grpc_port=int(os.getenv("QDRANT_GRPC_PORT", QDRANT_GRPC_PORT)),
+        timeout=QDRANT_TIMEOUT,
+        grpc_options={
+            "grpc.max_send_message_length": QDRANT_GRPC_MAX_MESSAGE,
+            "grpc.max_receive_message_length": QDRANT_GRPC_MAX_MESSAGE,
+        },
+    )
+    logger.info("🔌 Using Qdrant server at %s over gRPC.", url)
+    # mem0's QdrantConfig has no prefer_grpc option, so it gets a ready-made
+    # client. Its validator still insists on a path, which goes unused.
+    return {"client": client, "path": storage_path}
 
 # --- The Core MCP Component Logic ---
 class Mem0MCPComponent:
     def __init__(self):
-        storage_path = "/tmp/mem0_storage"
-        os.makedirs(storage_path, exist_ok=True)
-        print(f"💾 Using TEMPORARY storage at: {storage_path}.")
-
-        # --- THE DEFINITIVE CONFIGURATION ---
-        # This configuration satisfies all of the library's initialization quirks:
-        # 1. Provides `vector_store` for our custom path.
-        # 2. PROVIDES the `custom_..._prompt` keys as `None` to prevent the first type of AttributeError.
-        # 3. OMITS `llm` and `embedder` keys entirely, so the library creates its own defaults
-        #    instead of crashing on `None.provider`.
-        config_dict = {
+        # mem0 pulls in qdrant, openai and friends; import it only once the
+        # server is actually starting up.
+        import httpx
+        from mem0 import Memory
+        from mem0.configs.base import MemoryConfig
+        from mem0.embeddings.openai import OpenAIEmbedding
+        from openai import OpenAI
+
+        storage_path = os.getenv("MEM0_STORAGE", DEFAULT_STORAGE_PATH)
+        logger.info("💾 Using TEMPORARY storage at: %s.", storage_path)
+
+        # Only `vector_store` is set; mem0 fills in its default OpenAI LLM
+        # and embedder.
+        config = MemoryConfig.model_validate({
             "vector_store": {
                 "provider": "qdrant",
-                "config": {
-                    "path": storage_path
-                }
+                "config": qdrant_store_config(storage_path),
             },
-            # These keys MUST exist, even if they are None.
-            "custom_fact_extraction_prompt": None,
-            "custom_update_memory_prompt": None,
-            "custom_summarization_prompt": None,
-        }
-        
-        config_object = dict_to_namespace(config_dict)
-        
-        print("🔧 Passing the definitive 'hybrid' config to mem0...")
+        })
 
         # Reminder: You still need the OPENAI_API_KEY environment variable in Render
         # for the default LLM and embedder to work.
         if not os.getenv("OPENAI_API_KEY"):
-            print("⚠️ WARNING: OPENAI_API_KEY env var not set. mem0 will likely fail.")
-        
-        self.mem0 = Memory(config=config_object)
-        
-        self.state = MCPState()
-        print("✅✅✅ Mem0 MCP Component Initialized SUCCESSFULLY!")
+            logger.warning("⚠️ OPENAI_API_KEY env var not set. mem0 will likely fail.")
+
+        self.mem0 = Memory(config=config)
+
+        self._http = httpx.Client(
+            http2=True,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        )
+        for owner in (self.mem0.embedding_model, self.mem0.llm):
+            client = getattr(owner, "client", None)
+            if isinstance(client, OpenAI):
+                owner.client = client.with_options(http_client=self._http, timeout=HTTP_TIMEOUT)
+
+        self.mem0.embedding_model = EmbeddingCache(
+            self.mem0.embedding_model,
+            batch=isinstance(self.mem0.embedding_model, OpenAIEmbedding),
+        )
+        self._search_cache = SearchCache()
+        self._tenant_index = TenantIndex()
+        self._tenant_loads: Dict[str, asyncio.Task] = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=MEM0_THREADS, thread_name_prefix="mem0")
+        self._add_queue: "asyncio.Queue[Tuple[str, str]]" = asyncio.Queue(maxsize=ADD_QUEUE_SIZE)
+        self._add_task: Optional[asyncio.Task] = None
+        self._embed_queue: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = asyncio.Queue()
+        self._embed_task: Optional[asyncio.Task] = None
+        # Embedder calls in flight at once; each one holds an executor thread.
+        self._embed_slots = asyncio.Semaphore(MEM0_THREADS)
+        self._embed_calls: Set[asyncio.Task] = set()
+        logger.info("✅ Mem0 MCP Component initialized.")
+
+    def start(self):
+        self._add_task = asyncio.create_task(self._add_worker())
+        self._embed_task = asyncio.create_task(self._embed_worker())
+
+    async def stop(self):
+        try:
+            await asyncio.wait_for(self._add_queue.join(), ADD_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Dropping %d queued adds on shutdown.", self._add_queue.qsize())
+        self._add_task.cancel()
+        self._embed_task.cancel()
+        for task in list(self._embed_calls):
+            task.cancel()
+        for task in list(self._tenant_loads.values()):
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._http.close()
+
+    async def invoke(self, invoke_data: InvokePayload) -> Dict[str, Any]:
+        # Validation stays on the event loop; only the blocking mem0 calls
+        # (LLM, embedder, Qdrant) are pushed onto the mem0 executor.
+        logger.debug("🚀 Invoking action %s for user %s", invoke_data.action, invoke_data.user_id)
+        match invoke_data:
+            case AddPayload(content=content, user_id=user_id):
+                await self._add_queue.put((content, user_id))
+                return {"result": "Memory queued."}
+            case SearchPayload(query=query, user_id=user_id):
+                try:
+                    result = await self._search(query, user_id)
+                except Exception as e:
+                    logger.exception("🔥 Error during invoke: %s", e)
+                    raise HTTPException(status_code=500, detail={"error": str(e)})
+                return {"result": result}
+
+    async def invoke_batch(self, batch: BatchInvoke) -> Dict[str, Any]:
+        logger.debug("🚀 Invoking a batch of %d actions", len(batch.items))
+        # Adds are only queued, so searches in the same batch may not see them.
+        results: List[Optional[Dict[str, Any]]] = [None] * len(batch.items)
+        queries: List[Tuple[int, str, str]] = []
+        for index, item in enumerate(batch.items):
+            match item:
+                case AddPayload(content=content, user_id=user_id):
+                    await self._add_queue.put((content, user_id))
+                    results[index] = {"result": "Memory queued."}
+                case SearchPayload(query=query, user_id=user_id):
+                    queries.append((index, query, user_id))
+        if queries:
+            try:
+                found = await self._search_many([(query, user_id) for _, query, user_id in queries])
+            except Exception as e:
+                logger.exception("🔥 Error during batch invoke: %s", e)
+                raise HTTPException(status_code=500, detail={"error": str(e)})
+            for (index, _, _), result in zip(queries, found):
+                results[index] = {"result": result}
+        return {"results": results}
+
+    async def _search(self, query: str, user_id: str):
+        return (await self._search_many([(query, user_id)]))[0]
 
-    def get_state(self) -> MCPState:
-        return self.state
+    async def _search_many(self, searches: List[Tuple[str, str]]) -> List[Any]:
+        keys = [normalize_query(query) for query, _ in searches]
+        results = [self._search_cache.get(user_id, key) for key, (_, user_id) in zip(keys, searches)]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if not misses:
+            return results
 
-    def update_state(self, new_state: MCPState):
-        self.state = new_state
-        return {"status": "success", "new_state": self.state.dict()}
+        generations = {user_id: self._search_cache.generation(user_id) for _, user_id in searches}
+        vectors = await self._embed([searches[i][0] for i in misses])
+        pending = []
+        for i, vector in zip(misses, vectors):
+            results[i] = self._search_cache.get_similar(searches[i][1], keys[i], vector)
+            if results[i] is None:
+                pending.append((i, vector))
+        if not pending:
+            return results
 
-    def invoke(self, invoke_data: InvokePayload) -> Dict[str, Any]:
-        action = invoke_data.action
-        payload = invoke_data.payload
-        user_id = self.state.user_id
+        hits = await self._run(self._query_store, [(vector, searches[i][1]) for i, vector in pending])
+        for (i, vector), (points, remote) in zip(pending, hits):
+            user_id = searches[i][1]
+            results[i] = {"results": format_memories(points)}
+            self._search_cache.put(user_id, keys[i], vector, results[i], generations[user_id])
+            if remote:
+                self._schedule_tenant_load(user_id)
+        return results
 
-        if not user_id:
-            raise HTTPException(status_code=400, detail={"error": "user_id is not set. Please update state first."})
+    def _query_store(self, searches: List[Tuple[List[float], str]]) -> List[Tuple[list, bool]]:
+        # Returns (points, whether Qdrant had to answer) per search.
+        from qdrant_client import models
 
+        store = self.mem0.vector_store
+        local = [self._tenant_index.search(user_id, vector, SEARCH_LIMIT) for vector, user_id in searches]
+        results = [(points, False) for points in local]
+        remote = [i for i, points in enumerate(local) if points is None]
+        if not remote:
+            return results
+
+        # One Qdrant round trip for every search it still has to answer.
+        responses = store.client.query_batch_points(
+            collection_name=store.collection_name,
+            requests=[
+                models.QueryRequest(
+                    query=searches[i][0],
+                    filter=store._create_filter({"user_id": searches[i][1]}),
+                    limit=SEARCH_LIMIT,
+                    with_payload=True,
+                )
+                for i in remote
+            ],
+        )
+        for i, response in zip(remote, responses):
+            results[i] = (response.points, True)
+        return results
+
+    def _schedule_tenant_load(self, user_id: str):
+        # Loads run in the background after the search has been answered, and
+        # concurrent searches for the same user share one load.
+        if user_id in self._tenant_loads or not self._tenant_index.should_load(user_id):
+            return
+        self._tenant_loads[user_id] = asyncio.create_task(self._load_tenant(user_id))
+
+    async def _load_tenant(self, user_id: str):
         try:
-            if action == "add":
-                content = payload.get("content")
-                if not content:
-                    raise HTTPException(status_code=400, detail={"error": "Missing 'content'."})
-                self.mem0.add(content=content, user_id=user_id)
-                return {"result": "Memory added successfully."}
-
-            elif action == "search":
-                query = payload.get("query")
-                if not query:
-                    raise HTTPException(status_code=400, detail={"error": "Missing 'query'."})
-                results = self.mem0.search(query=query, user_id=user_id)
-                return {"result": results}
-
-            else:
-                raise HTTPException(status_code=400, detail={"error": f"Unknown action: {action}"})
+            await self._run(self._copy_tenant, user_id)
         except Exception as e:
-            print(f"🔥 Error during invoke: {e}")
-            raise HTTPException(status_code=500, detail={"error": str(e)})
+            logger.warning("⚠️ Copying memories of user %s failed: %s", user_id, e)
+        finally:
+            del self._tenant_loads[user_id]
+
+    def _copy_tenant(self, user_id: str):
+        # Counting first keeps users that are too big from pulling their
+        # vectors over just to be turned away.
+        store = self.mem0.vector_store
+        index = self._tenant_index
+        generation = index.generation(user_id)
+        user_filter = store._create_filter({"user_id": user_id})
+        count = store.client.count(
+            collection_name=store.collection_name, count_filter=user_filter, exact=True
+        ).count
+        if count > index.max_points:
+            index.put(user_id, None, generation)
+            return
+        points, _ = store.client.scroll(
+            collection_name=store.collection_name,
+            scroll_filter=user_filter,
+            limit=index.max_points + 1,
+            with_payload=True,
+            with_vectors=True,
+        )
+        index.put(user_id, points, generation)
+
+    def _embed(self, texts: List[str]) -> "asyncio.Future":
+        future = asyncio.get_running_loop().create_future()
+        self._embed_queue.put_nowait((texts, future))
+        return future
+
+    async def _embed_worker(self):
+        # Batches are embedded in their own tasks so one slow upstream call
+        # does not hold up the next batch; the worker only waits here when
+        # every slot is busy, which also lets the queue fill a bigger batch.
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._embed_slots.acquire()
+            jobs = [await self._embed_queue.get()]
+            count = len(jobs[0][0])
+            deadline = loop.time() + EMBED_BATCH_WINDOW
+            while count < EMBED_BATCH_SIZE and (timeout := deadline - loop.time()) > 0:
+                try:
+                    jobs.append(await asyncio.wait_for(self._embed_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                count += len(jobs[-1][0])
+            task = asyncio.create_task(self._embed_batch(jobs))
+            self._embed_calls.add(task)
+            task.add_done_callback(self._embed_calls.discard)
+
+    async def _embed_batch(self, jobs: List[Tuple[List[str], asyncio.Future]]):
+        texts = [text for job_texts, _ in jobs for text in job_texts]
+        try:
+            vectors = await self._run(self.mem0.embedding_model.embed_many, texts, "search")
+        except Exception as e:
+            for _, future in jobs:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._embed_slots.release()
+        start = 0
+        for job_texts, future in jobs:
+            # The future is already cancelled if its request went away.
+            if not future.done():
+                future.set_result(vectors[start:start + len(job_texts)])
+            start += len(job_texts)
+
+    def _run(self, fn, *args, **kwargs) -> "asyncio.Future":
+        return asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def _add_worker(self):
+        # Warm up from the add worker: it keeps the throwaway write off the
+        # startup path and in line with every other write to the store.
+        try:
+            await self._run(self._warmup)
+        except Exception as e:
+            logger.warning("⚠️ Warmup failed: %s", e)
+
+        while True:
+            jobs = [await self._add_queue.get()]
+            while len(jobs) < ADD_BATCH_SIZE and not self._add_queue.empty():
+                jobs.append(self._add_queue.get_nowait())
+            try:
+                await self._run(self._add_all, jobs)
+            finally:
+                for user_id in {user_id for _, user_id in jobs}:
+                    self._search_cache.invalidate(user_id)
+                    self._tenant_index.invalidate(user_id)
+                for _ in jobs:
+                    self._add_queue.task_done()
+
+    def _warmup(self):
+        # Loads the qdrant segments and opens the embedder's connection before
+        # the first real request. infer=False skips the LLM call.
+        self.mem0.add("warmup", user_id=WARMUP_USER_ID, infer=False)
+        self.mem0.search("warmup", user_id=WARMUP_USER_ID)
+        self.mem0.delete_all(user_id=WARMUP_USER_ID)
+        logger.info("🌡️ Warmup finished.")
+
+    def _add_all(self, jobs: List[Tuple[str, str]]):
+        for content, user_id in jobs:
+            try:
+                self.mem0.add(content, user_id=user_id)
+            except Exception:
+                logger.exception("🔥 Error adding memory for user %s", user_id)
 
 # --- FastAPI App Setup ---
-app = FastAPI(title="Mem0 MCP Server")
-component = Mem0MCPComponent()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pay the JIT compile before the first request rather than during it.
+    await asyncio.to_thread(sim_kernel.warmup)
+    component = app.state.component = Mem0MCPComponent()
+    component.start()
+    yield
+    await component.stop()
+
+app = FastAPI(title="Mem0 MCP Server", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# 413 bodies are rendered once per limited path rather than on every rejection.
+TOO_LARGE_BODIES = {
+    path: ORJSONResponse({"detail": {"error": f"Request body exceeds {limit} bytes."}}).body
+    for path, limit in MAX_BODY_BYTES.items()
+}
+
+def too_large(path: str) -> Response:
+    return Response(TOO_LARGE_BODIES[path], status_code=413, media_type="application/json")
+
+class BodyTooLarge(Exception):
+    """Raised by `read_body` once a body without Content-Length passes its limit."""
+
+@app.exception_handler(BodyTooLarge)
+async def body_too_large_handler(request: Request, exc: BodyTooLarge):
+    return too_large(request.url.path)
+
+# Rejects by Content-Length before anything is read; chunked bodies carry no
+# length and are cut off by read_body instead.
+@app.middleware("http")
+async def limit_body_size(request: Request, call_next):
+    limit = MAX_BODY_BYTES.get(request.url.path)
+    length = request.headers.get("content-length")
+    if limit is not None and length is not None and length.isdigit() and int(length) > limit:
+        return too_large(request.url.path)
+    return await call_next(request)
 
-@app.post("/get_state")
-def get_state_endpoint():
-    return component.get_state()
+# Bodies are parsed straight from bytes with validators built once at import,
+# instead of FastAPI's json.loads followed by validating the resulting dict.
+_INVOKE_ADAPTER = TypeAdapter(InvokePayload)
+_BATCH_ADAPTER = TypeAdapter(BatchInvoke)
 
-@app.post("/update_state")
-def update_state_endpoint(state: MCPState):
-    return component.update_state(state)
+async def read_body(request: Request) -> bytes:
+    limit = MAX_BODY_BYTES[request.url.path]
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise BodyTooLarge()
+    return bytes(body)
 
-@app.post("/invoke")
-def invoke_endpoint(invoke_data: InvokePayload):
-    return component.invoke(invoke_data)
+async def parse_body(adapter: TypeAdapter, request: Request):
+    body = await read_body(request)
+    try:
+        return adapter.validate_json(body)
+    except ValidationError as e:
+        # Same 422 body FastAPI produces for a declared body parameter.
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+# FastAPI only documents declared body parameters, so the schemas go in by
+# hand. Their $defs (AddPayload, SearchPayload, ...) become OpenAPI components.
+_BODY_SCHEMA_DEFS: Dict[str, Any] = {}
+
+def request_body(adapter: TypeAdapter) -> Dict[str, Any]:
+    schema = adapter.json_schema(ref_template="#/components/schemas/{model}")
+    _BODY_SCHEMA_DEFS.update(schema.pop("$defs", {}))
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}}
+
+def openapi() -> Dict[str, Any]:
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(_BODY_SCHEMA_DEFS)
+    return app.openapi_schema
+
+app.openapi = openapi
+
+# Handlers return ORJSONResponse themselves so FastAPI skips jsonable_encoder
+# on the way out; the results are already plain JSON types.
+@app.post("/invoke", openapi_extra=request_body(_INVOKE_ADAPTER))
+async def invoke_endpoint(request: Request):
+    invoke_data = await parse_body(_INVOKE_ADAPTER, request)
+    result = await request.app.state.component.invoke(invoke_data)
+    return ORJSONResponse(result, status_code=202 if isinstance(invoke_data, AddPayload) else 200)
+
+@app.post("/invoke_batch", openapi_extra=request_body(_BATCH_ADAPTER))
+async def invoke_batch_endpoint(request: Request):
+    batch = await parse_body(_BATCH_ADAPTER, request)
+    return ORJSONResponse(await request.app.state.component.invoke_batch(batch))
 
 # --- Run the server ---
+def worker_count() -> int:
+    # qdrant-local takes an exclusive lock on its storage folder (and mem0
+    # wipes it on start), so only a Qdrant server can back several workers.
+    if not os.getenv("QDRANT_URL"):
+        if int(os.getenv("WEB_CONCURRENCY", 1)) > 1:
+            logger.warning("⚠️ Ignoring WEB_CONCURRENCY: the embedded store only supports one worker.")
+        return 1
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.environ["WEB_CONCURRENCY"])
+    return os.cpu_count() or 1
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run(
+        "mcp_server:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8001)),
+        loop="uvloop",
+        http="httptools",
+        workers=worker_count(),
+    )
 
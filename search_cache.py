@@ -0,0 +1,234 @@
+# search_cache.py
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from sim_kernel import quantize, top1_cosine
+
+# --- Cache sizing ---
+# Sized per worker for a small instance. Each semantic row pins one result of
+# up to SEARCH_LIMIT memories, which outweighs its int8 embedding.
+EXACT_CACHE_SIZE = 1024        # (user_id, query) entries, LRU
+SEMANTIC_CACHE_SIZE = 512      # embedded queries kept per user
+SEMANTIC_CACHE_USERS = 256     # users with a live semantic cache, LRU
+SEMANTIC_CACHE_BUDGET = 4096   # embedded queries kept across all users, LRU by user
+SIMILARITY_THRESHOLD = 0.95    # cosine similarity needed to reuse a result
+CACHE_TTL = 60.0               # seconds; bounds staleness from writes we never see
+
+
+def normalize_query(query: str) -> str:
+    return query.strip().lower()
+
+
+def _query_key(user_id: str, query: str) -> Tuple[str, bytes]:
+    return user_id, hashlib.blake2b(query.encode(), digest_size=8).digest()
+
+
+def _unit(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+class _UserVectors:
+    """Unit-norm query embeddings for one user plus the results they produced.
+
+    Embeddings are stored int8-quantized with a per-row scale, a quarter of
+    the float32 footprint (and of the memory traffic of each scan). Rows
+    live in a preallocated matrix that doubles until it reaches `capacity`;
+    after that the oldest row is overwritten. `prune` compacts away expired
+    rows so that they do not pin their results until then.
+    """
+
+    __slots__ = ("matrix", "scales", "results", "expires", "size", "capacity", "next_slot")
+
+    def __init__(self, dim: int, capacity: int):
+        self.matrix = np.empty((min(16, capacity), dim), dtype=np.int8)
+        self.scales = np.empty(min(16, capacity), dtype=np.float32)
+        self.results: List[Any] = []
+        self.expires: List[float] = []
+        self.size = 0
+        self.capacity = capacity
+        self.next_slot = 0
+
+    def append(self, vector: np.ndarray, result: Any, expires: float):
+        codes, scale = quantize(vector)
+        if self.size < self.capacity:
+            if self.size == len(self.matrix):
+                rows = min(2 * self.size, self.capacity)
+                grown = np.empty((rows, self.matrix.shape[1]), dtype=np.int8)
+                grown[:self.size] = self.matrix
+                self.matrix = grown
+                self.scales = np.resize(self.scales, rows)
+            self.matrix[self.size] = codes
+            self.scales[self.size] = scale
+            self.results.append(result)
+            self.expires.append(expires)
+            self.size += 1
+        else:
+            self.matrix[self.next_slot] = codes
+            self.scales[self.next_slot] = scale
+            self.results[self.next_slot] = result
+            self.expires[self.next_slot] = expires
+            self.next_slot = (self.next_slot + 1) % self.capacity
+
+    def prune(self, now: float):
+        # Rows share one TTL, so they expire in insertion order, oldest first.
+        oldest = self.next_slot if self.size == self.capacity else 0
+        if not self.size or self.expires[oldest] > now:
+            return
+        order = [(oldest + i) % self.size for i in range(self.size)]
+        keep = [i for i in order if self.expires[i] > now]
+        rows = len(self.matrix)
+        if len(keep) <= rows // 4:
+            rows = max(min(16, self.capacity), 2 * len(keep))
+        matrix = np.empty((rows, self.matrix.shape[1]), dtype=np.int8)
+        matrix[:len(keep)] = self.matrix[keep]
+        scales = np.empty(rows, dtype=np.float32)
+        scales[:len(keep)] = self.scales[keep]
+        self.matrix, self.scales = matrix, scales
+        self.results = [self.results[i] for i in keep]
+        self.expires = [self.expires[i] for i in keep]
+        self.size = len(keep)
+        self.next_slot = 0
+
+
+class SearchCache:
+    """Two-level cache in front of `Memory.search`.
+
+    Level one is an exact LRU keyed by `(user_id, hash of the normalized
+    query)`. Level two compares the query embedding against the embeddings
+    of earlier queries from the same user and reuses a result whose cosine
+    similarity reaches `threshold`. It keeps at most `semantic_size` queries
+    per user and `semantic_budget` across users, evicting whole users in LRU
+    order.
+
+    Adds through this process invalidate a user's entries right away; `ttl`
+    bounds how long results can miss writes made elsewhere, such as by
+    another worker sharing the same Qdrant server.
+
+    The cache is not thread-safe; it is only touched from the event loop.
+    """
+
+    def __init__(
+        self,
+        exact_size: int = EXACT_CACHE_SIZE,
+        semantic_size: int = SEMANTIC_CACHE_SIZE,
+        semantic_users: int = SEMANTIC_CACHE_USERS,
+        semantic_budget: int = SEMANTIC_CACHE_BUDGET,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl: float = CACHE_TTL,
+    ):
+        self.exact_size = exact_size
+        self.semantic_size = semantic_size
+        self.semantic_users = semantic_users
+        self.semantic_budget = semantic_budget
+        self.threshold = threshold
+        self.ttl = ttl
+        # Values are (expiry on the monotonic clock, result).
+        self._exact_cache: "OrderedDict[Tuple[str, bytes], Tuple[float, Any]]" = OrderedDict()
+        self._user_keys: Dict[str, Set[Tuple[str, bytes]]] = {}
+        self._sem_cache: "OrderedDict[str, _UserVectors]" = OrderedDict()
+        self._sem_rows = 0
+        # Bumped on every invalidation so that a search which started before
+        # an add finished cannot store a stale result afterwards.
+        self._generations: Dict[str, int] = {}
+
+    def generation(self, user_id: str) -> int:
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id: str, query: str) -> Optional[Any]:
+        key = _query_key(user_id, query)
+        entry = self._exact_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop_exact(key)
+            return None
+        self._exact_cache.move_to_end(key)
+        return entry[1]
+
+    def get_similar(self, user_id: str, query: str, vector) -> Optional[Any]:
+        entry = self._sem_cache.get(user_id)
+        if entry is None:
+            return None
+        self._sem_cache.move_to_end(user_id)
+        if not self._prune_vectors(user_id, entry, time.monotonic()):
+            return None
+        codes, scale = quantize(_unit(vector))
+        best, score = top1_cosine(entry.matrix[:entry.size], entry.scales[:entry.size], codes, scale)
+        if score < self.threshold:
+            return None
+        result = entry.results[best]
+        self._put_exact(user_id, query, result, entry.expires[best])
+        return result
+
+    def put(self, user_id: str, query: str, vector, result: Any, generation: int):
+        if generation != self.generation(user_id):
+            return
+        now = time.monotonic()
+        expires = now + self.ttl
+        self._put_exact(user_id, query, result, expires)
+        # Sweep the least recently used user too, so expired rows of users
+        # who stopped searching are freed without waiting for eviction.
+        if self._sem_cache:
+            oldest = next(iter(self._sem_cache))
+            self._prune_vectors(oldest, self._sem_cache[oldest], now)
+        entry = self._sem_cache.get(user_id)
+        if entry is not None and self._prune_vectors(user_id, entry, now):
+            self._sem_cache.move_to_end(user_id)
+        else:
+            entry = self._sem_cache[user_id] = _UserVectors(len(vector), min(self.semantic_size, self.semantic_budget))
+        self._sem_rows -= entry.size
+        entry.append(_unit(vector), result, expires)
+        self._sem_rows += entry.size
+        # The user just written is last in LRU order and never holds more than
+        # the budget alone, so this stops before reaching them.
+        while len(self._sem_cache) > self.semantic_users or self._sem_rows > self.semantic_budget:
+            self._drop_vectors(next(iter(self._sem_cache)))
+
+    def invalidate(self, user_id: str):
+        self._generations[user_id] = self.generation(user_id) + 1
+        self._drop_vectors(user_id)
+        for key in self._user_keys.pop(user_id, ()):
+            del self._exact_cache[key]
+
+    def _put_exact(self, user_id: str, query: str, result: Any, expires: float):
+        key = _query_key(user_id, query)
+        self._exact_cache[key] = (expires, result)
+        self._exact_cache.move_to_end(key)
+        self._user_keys.setdefault(user_id, set()).add(key)
+        if len(self._exact_cache) > self.exact_size:
+            self._drop_exact(next(iter(self._exact_cache)))
+        # Expired entries at the cold end are freed as well as hidden.
+        now = time.monotonic()
+        while self._exact_cache:
+            oldest = next(iter(self._exact_cache))
+            if self._exact_cache[oldest][0] > now:
+                break
+            self._drop_exact(oldest)
+
+    def _prune_vectors(self, user_id: str, entry: _UserVectors, now: float) -> bool:
+        """Drop the expired rows of `entry`; False if none are left."""
+        self._sem_rows -= entry.size
+        entry.prune(now)
+        self._sem_rows += entry.size
+        if not entry.size:
+            del self._sem_cache[user_id]
+            return False
+        return True
+
+    def _drop_vectors(self, user_id: str):
+        entry = self._sem_cache.pop(user_id, None)
+        if entry is not None:
+            self._sem_rows -= entry.size
+
+    def _drop_exact(self, key: Tuple[str, bytes]):
+        del self._exact_cache[key]
+        keys = self._user_keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._user_keys[key[0]]
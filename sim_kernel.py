@@ -0,0 +1,62 @@
+# sim_kernel.py
+import numpy as np
+
+# Numba is optional: without it the same scan runs through NumPy.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _top1_cosine_numpy(M, scales, q, q_scale):
+    scores = np.dot(M, q.astype(np.int32)) * scales * q_scale
+    best = int(np.argmax(scores))
+    return best, scores[best]
+
+
+if njit is not None:
+    # Single-threaded on purpose: Numba's parallel backend would start its
+    # own thread pool in every uvicorn worker, and its default workqueue
+    # layer is unsafe to call from the several threads of our threadpool.
+    @njit(cache=True, fastmath=True)
+    def _top1_cosine(M, scales, q, q_scale):
+        n, d = M.shape
+        best, best_score = 0, np.float32(-np.inf)
+        for i in range(n):
+            acc = np.int32(0)
+            for j in range(d):
+                acc += np.int32(M[i, j]) * np.int32(q[j])
+            score = np.float32(acc) * scales[i] * q_scale
+            if score > best_score:
+                best, best_score = i, score
+        return best, best_score
+else:
+    _top1_cosine = _top1_cosine_numpy
+
+
+def quantize(v: np.ndarray):
+    """Quantize a float vector to int8; returns `(codes, scale)`.
+
+    `codes * scale` approximates `v`. The scale maps the largest absolute
+    component to 127.
+    """
+    peak = float(np.max(np.abs(v)))
+    scale = peak / 127 if peak else 1.0
+    return np.round(v / scale).astype(np.int8), np.float32(scale)
+
+
+def top1_cosine(M: np.ndarray, scales: np.ndarray, q: np.ndarray, q_scale: float):
+    """Return `(row, similarity)` of the row of `M` closest to `q`.
+
+    `M`/`scales` and `q`/`q_scale` come from `quantize` applied to unit-norm
+    vectors, so the rescaled int32 dot product is the cosine similarity.
+    `M` must have at least one row.
+    """
+    best, score = _top1_cosine(M, scales, q, np.float32(q_scale))
+    return int(best), float(score)
+
+
+def warmup():
+    """Compile the kernel (or load it from Numba's on-disk cache) up front."""
+    codes, scale = quantize(np.ones(4, dtype=np.float32))
+    top1_cosine(np.stack([codes, codes]), np.full(2, scale, dtype=np.float32), codes, scale)
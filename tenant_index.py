@@ -0,0 +1,153 @@
+# tenant_index.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from search_cache import CACHE_TTL
+
+# --- Index sizing ---
+TENANT_INDEX_POINTS = 5_000     # users with more memories always go to Qdrant
+TENANT_INDEX_BUDGET = 20_000    # points kept across all users, LRU by user
+                                # (about 120 MB of float32 at 1536 dims)
+TENANT_INDEX_USERS = 1024       # users tracked, including ones too big to copy
+
+
+class Hit(NamedTuple):
+    """The fields of a Qdrant `ScoredPoint` that `format_memories` reads."""
+    id: Any
+    payload: Dict[str, Any]
+    score: float
+
+
+class _Tenant:
+    """One user's points as unit-norm rows; `matrix` is None if there were too many."""
+
+    __slots__ = ("ids", "payloads", "matrix", "expires")
+
+    def __init__(self, points: Optional[list], expires: float):
+        self.expires = expires
+        if points is None:
+            self.ids, self.payloads, self.matrix = [], [], None
+            return
+        self.ids = [point.id for point in points]
+        self.payloads = [point.payload for point in points]
+        if not points:
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+            return
+        matrix = np.asarray([point.vector for point in points], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms, norms, 1)
+
+
+class TenantIndex:
+    """In-memory copy of the memories of recently searched users.
+
+    A user is copied once `should_load` sees them search twice with no add
+    in between; the caller then loads their points from Qdrant in one
+    scroll. Searches for that user are then an exact cosine top-k over the
+    copy and never reach Qdrant. The scores match Qdrant's, which normalizes
+    vectors for cosine distance. Users with more than `max_points` memories
+    are remembered as too big and are searched in Qdrant. At most `budget`
+    points and `max_users` users are kept; the least recently searched user
+    goes first.
+
+    Copies are dropped when the user adds a memory, because mem0 may also
+    update or delete existing ones; the too-big marker stays. `ttl` bounds
+    how long either can miss writes made elsewhere, as in `SearchCache`.
+
+    Searches run on the mem0 executor, so every access takes the lock.
+    """
+
+    def __init__(
+        self,
+        max_points: int = TENANT_INDEX_POINTS,
+        budget: int = TENANT_INDEX_BUDGET,
+        max_users: int = TENANT_INDEX_USERS,
+        ttl: float = CACHE_TTL,
+    ):
+        self.max_points = max_points
+        self.budget = budget
+        self.max_users = max_users
+        self.ttl = ttl
+        self._tenants: "OrderedDict[str, _Tenant]" = OrderedDict()
+        self._size = 0
+        # Same role as in SearchCache: a load that raced an add is discarded.
+        self._generations: Dict[str, int] = {}
+        # Generation at each user's last search that had to go to Qdrant.
+        self._searched: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def generation(self, user_id: str) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def should_load(self, user_id: str) -> bool:
+        """Record a search of `user_id` that Qdrant answered.
+
+        True when the previous such search saw the same generation, i.e. the
+        user searched again without adding in between.
+        """
+        with self._lock:
+            if self._live(user_id) is not None:
+                return False
+            generation = self._generations.get(user_id, 0)
+            previous = self._searched.pop(user_id, None)
+            self._searched[user_id] = generation
+            if len(self._searched) > self.max_users:
+                self._searched.popitem(last=False)
+            return previous == generation
+
+    def search(self, user_id: str, vector, limit: int) -> Optional[List[Hit]]:
+        """Top `limit` memories of `user_id`, or None if Qdrant must answer."""
+        with self._lock:
+            tenant = self._live(user_id)
+            if tenant is None or tenant.matrix is None:
+                return None
+            self._tenants.move_to_end(user_id)
+        if not tenant.ids:
+            return []
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        scores = tenant.matrix @ (q / norm if norm else q)
+        if limit < len(scores):
+            top = np.argpartition(scores, -limit)[-limit:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [Hit(tenant.ids[i], tenant.payloads[i], float(scores[i])) for i in top]
+
+    def put(self, user_id: str, points: Optional[list], generation: int):
+        """Store `points` for `user_id`; None (or too many) marks the user as too big."""
+        if points is not None and len(points) > self.max_points:
+            points = None
+        tenant = _Tenant(points, time.monotonic() + self.ttl)
+        with self._lock:
+            if generation != self._generations.get(user_id, 0):
+                return
+            self._drop(user_id)
+            self._tenants[user_id] = tenant
+            self._size += len(tenant.ids)
+            while self._size > self.budget or len(self._tenants) > self.max_users:
+                self._drop(next(iter(self._tenants)))
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            tenant = self._tenants.get(user_id)
+            if tenant is not None and tenant.matrix is not None:
+                self._drop(user_id)
+
+    def _live(self, user_id: str) -> Optional[_Tenant]:
+        tenant = self._tenants.get(user_id)
+        if tenant is not None and tenant.expires <= time.monotonic():
+            self._drop(user_id)
+            return None
+        return tenant
+
+    def _drop(self, user_id: str):
+        tenant = self._tenants.pop(user_id, None)
+        if tenant is not None:
+            self._size -= len(tenant.ids)
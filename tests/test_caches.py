@@ -0,0 +1,288 @@
+import types
+
+import numpy as np
+import pytest
+
+import search_cache
+import sim_kernel
+import tenant_index
+from embedding_cache import EmbeddingCache
+from search_cache import SearchCache
+from tenant_index import TenantIndex
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the monotonic clock of both cache modules with one we advance by hand."""
+    now = [1000.0]
+    fake_time = types.SimpleNamespace(monotonic=lambda: now[0])
+    monkeypatch.setattr(search_cache, "time", fake_time)
+    monkeypatch.setattr(tenant_index, "time", fake_time)
+    return now
+
+
+def unit_rows(rng, n, dim):
+    rows = rng.standard_normal((n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+# --- sim_kernel ---
+
+def test_top1_cosine_matches_numpy_fallback():
+    rng = np.random.default_rng(0)
+    rows = unit_rows(rng, 200, 64)
+    quantized = [sim_kernel.quantize(row) for row in rows]
+    M = np.stack([codes for codes, _ in quantized])
+    scales = np.array([scale for _, scale in quantized], dtype=np.float32)
+    for q in unit_rows(rng, 20, 64):
+        codes, scale = sim_kernel.quantize(q)
+        best, score = sim_kernel.top1_cosine(M, scales, codes, scale)
+        expected_best, expected_score = sim_kernel._top1_cosine_numpy(M, scales, codes, np.float32(scale))
+        assert best == expected_best
+        assert score == pytest.approx(float(expected_score), abs=1e-5)
+
+
+def test_top1_cosine_approximates_exact_cosine():
+    rng = np.random.default_rng(1)
+    rows = unit_rows(rng, 50, 128)
+    quantized = [sim_kernel.quantize(row) for row in rows]
+    M = np.stack([codes for codes, _ in quantized])
+    scales = np.array([scale for _, scale in quantized], dtype=np.float32)
+    codes, scale = sim_kernel.quantize(rows[7])
+    best, score = sim_kernel.top1_cosine(M, scales, codes, scale)
+    assert best == 7
+    assert score == pytest.approx(1.0, abs=0.01)
+
+
+# --- SearchCache ---
+
+def test_exact_entry_expires(clock):
+    cache = SearchCache(ttl=10)
+    cache.put("u1", "tea", [1.0, 0.0], {"results": []}, cache.generation("u1"))
+    assert cache.get("u1", "tea") == {"results": []}
+    clock[0] += 11
+    assert cache.get("u1", "tea") is None
+
+
+def test_similar_query_hits_until_expiry(clock):
+    cache = SearchCache(ttl=10, threshold=0.95)
+    cache.put("u1", "tea", [1.0, 0.0], "tea results", cache.generation("u1"))
+    assert cache.get_similar("u1", "some tea", [0.99, 0.01]) == "tea results"
+    assert cache.get_similar("u1", "coffee", [0.0, 1.0]) is None
+    assert cache.get_similar("u2", "some tea", [0.99, 0.01]) is None
+    clock[0] += 11
+    assert cache.get_similar("u1", "more tea", [0.99, 0.01]) is None
+
+
+def test_invalidate_bumps_generation_and_drops_entries(clock):
+    cache = SearchCache()
+    cache.put("u1", "tea", [1.0, 0.0], "tea results", cache.generation("u1"))
+    cache.put("u2", "tea", [1.0, 0.0], "other user", cache.generation("u2"))
+    generation = cache.generation("u1")
+    cache.invalidate("u1")
+    assert cache.generation("u1") == generation + 1
+    assert cache.get("u1", "tea") is None
+    assert cache.get_similar("u1", "tea", [1.0, 0.0]) is None
+    assert cache.get("u2", "tea") == "other user"
+
+
+def test_put_from_before_invalidate_is_dropped(clock):
+    cache = SearchCache()
+    generation = cache.generation("u1")
+    cache.invalidate("u1")
+    cache.put("u1", "tea", [1.0, 0.0], "stale", generation)
+    assert cache.get("u1", "tea") is None
+    assert cache.get_similar("u1", "tea", [1.0, 0.0]) is None
+
+
+def test_semantic_budget_evicts_least_recent_user(clock):
+    cache = SearchCache(semantic_size=3, semantic_budget=4)
+    for query, vector in (("a", [1.0, 0.0]), ("b", [0.0, 1.0])):
+        cache.put("u1", query, vector, query, cache.generation("u1"))
+        cache.put("u2", query, vector, query, cache.generation("u2"))
+    cache.put("u3", "a", [1.0, 0.0], "a", cache.generation("u3"))
+    assert cache.get_similar("u1", "x", [1.0, 0.0]) is None
+    assert cache.get_similar("u2", "x", [1.0, 0.0]) == "a"
+    assert cache.get_similar("u3", "x", [1.0, 0.0]) == "a"
+    assert cache._sem_rows == 3
+
+def test_expired_rows_are_freed(clock):
+    cache = SearchCache(ttl=10, semantic_size=4)
+    cache.put("u1", "a", [1.0, 0.0], "a", cache.generation("u1"))
+    cache.put("u1", "b", [0.0, 1.0], "b", cache.generation("u1"))
+    clock[0] += 5
+    for query, vector in (("c", [1.0, 1.0]), ("d", [1.0, -1.0]), ("e", [-1.0, 1.0])):
+        cache.put("u1", query, vector, query, cache.generation("u1"))
+    clock[0] += 6
+    cache.put("u1", "f", [-1.0, -1.0], "f", cache.generation("u1"))
+    entry = cache._sem_cache["u1"]
+    assert entry.results == ["c", "d", "e", "f"]
+    assert cache._sem_rows == 4
+    assert cache.get_similar("u1", "x", [1.0, 1.0]) == "c"
+    clock[0] += 20
+    assert cache.get_similar("u1", "x", [1.0, 1.0]) is None
+    assert "u1" not in cache._sem_cache
+    assert cache._sem_rows == 0
+
+
+def test_put_sweeps_expired_rows_of_idle_users(clock):
+    cache = SearchCache(ttl=10)
+    cache.put("idle", "a", [1.0, 0.0], "a", cache.generation("idle"))
+    clock[0] += 11
+    cache.put("busy", "a", [1.0, 0.0], "a", cache.generation("busy"))
+    assert "idle" not in cache._sem_cache
+    assert cache._user_keys.keys() == {"busy"}
+
+
+# --- TenantIndex ---
+
+def points(vectors):
+    return [
+        types.SimpleNamespace(id=str(i), payload={"data": f"m{i}"}, vector=vector.tolist())
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def test_search_ranks_like_exact_cosine(clock):
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((300, 32)).astype(np.float32)
+    index = TenantIndex()
+    index.put("u1", points(vectors), index.generation("u1"))
+    q = rng.standard_normal(32).astype(np.float32)
+
+    hits = index.search("u1", q, 10)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (q / np.linalg.norm(q))
+    expected = np.argsort(-scores)[:10]
+    assert [hit.id for hit in hits] == [str(i) for i in expected]
+    assert [hit.score for hit in hits] == pytest.approx(scores[expected].tolist(), abs=1e-5)
+    assert len(index.search("u1", q, 1000)) == 300
+
+
+def test_search_without_copy_defers_to_qdrant(clock):
+    index = TenantIndex(max_points=2)
+    assert index.search("u1", [1.0, 0.0], 5) is None
+    index.put("u1", points(np.eye(3, dtype=np.float32)), index.generation("u1"))
+    assert index.search("u1", [1.0, 0.0, 0.0], 5) is None
+
+
+def test_should_load_after_second_search_without_add(clock):
+    index = TenantIndex()
+    assert not index.should_load("u1")
+    index.invalidate("u1")
+    assert not index.should_load("u1")
+    assert index.should_load("u1")
+
+
+def test_invalidate_drops_copy_but_keeps_too_big_marker(clock):
+    index = TenantIndex(max_points=2, ttl=10)
+    index.put("small", points(np.eye(2, dtype=np.float32)), index.generation("small"))
+    index.put("big", None, index.generation("big"))
+    index.invalidate("small")
+    index.invalidate("big")
+    assert index.search("small", [1.0, 0.0], 5) is None
+    assert not index.should_load("big")
+    clock[0] += 11
+    index.should_load("big")
+    assert index.should_load("big")
+
+
+def test_load_from_before_invalidate_is_dropped(clock):
+    index = TenantIndex()
+    generation = index.generation("u1")
+    index.invalidate("u1")
+    index.put("u1", points(np.eye(2, dtype=np.float32)), generation)
+    assert index.search("u1", [1.0, 0.0], 5) is None
+
+
+def test_budget_evicts_least_recently_searched_user(clock):
+    index = TenantIndex(budget=4)
+    for user_id in ("a", "b"):
+        index.put(user_id, points(np.eye(2, dtype=np.float32)), index.generation(user_id))
+    index.search("a", [1.0, 0.0], 1)
+    index.put("c", points(np.eye(2, dtype=np.float32)), index.generation("c"))
+    assert index.search("a", [1.0, 0.0], 1) is not None
+    assert index.search("b", [1.0, 0.0], 1) is None
+    assert index.search("c", [1.0, 0.0], 1) is not None
+
+
+# --- EmbeddingCache ---
+
+def fake_vector(text, memory_action=None):
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 0.5 if memory_action == "search" else 0.25]
+
+
+class FakeEmbedder:
+    """mem0-style embedder whose OpenAI client answers batches in reverse order."""
+
+    def __init__(self):
+        self.config = types.SimpleNamespace(model="fake-model", embedding_dims=3)
+        self.client = types.SimpleNamespace(embeddings=types.SimpleNamespace(create=self.create))
+        self.embedded = []
+        self.batches = []
+
+    def embed(self, text, memory_action=None):
+        self.embedded.append((text, memory_action))
+        return fake_vector(text, memory_action)
+
+    def create(self, input, model, dimensions):
+        self.batches.append(list(input))
+        data = [types.SimpleNamespace(index=i, embedding=fake_vector(text, "search")) for i, text in enumerate(input)]
+        return types.SimpleNamespace(data=data[::-1])
+
+
+def test_embed_many_reorders_batched_response_by_index():
+    embedder = FakeEmbedder()
+    cache = EmbeddingCache(embedder, batch=True)
+    texts = ["one", "three", "seventeen"]
+    vectors = cache.embed_many(texts, "search")
+    assert embedder.batches == [texts]
+    assert vectors == [pytest.approx(fake_vector(text, "search"), abs=1e-2) for text in texts]
+
+
+def test_embed_many_sends_only_misses_upstream():
+    embedder = FakeEmbedder()
+    cache = EmbeddingCache(embedder, batch=True)
+    cache.embed("two", "search")
+    cache.embed_many(["one", "two", "three"], "search")
+    assert embedder.batches == [["one", "three"]]
+    cache.embed_many(["one", "two", "three"], "search")
+    assert embedder.batches == [["one", "three"]]
+    assert embedder.embedded == [("two", "search")]
+
+
+def test_memory_action_is_part_of_the_key():
+    embedder = FakeEmbedder()
+    cache = EmbeddingCache(embedder)
+    add = cache.embed("tea", "add")
+    search = cache.embed("tea", "search")
+    assert add != search
+    assert cache.embed("tea", "add") == add
+    assert embedder.embedded == [("tea", "add"), ("tea", "search")]
+
+
+def test_lru_eviction_at_maxsize():
+    embedder = FakeEmbedder()
+    cache = EmbeddingCache(embedder, maxsize=2)
+    cache.embed("a")
+    cache.embed("b")
+    cache.embed("a")
+    cache.embed("c")
+    assert len(cache._entries) == 2
+    cache.embed("a")
+    cache.embed("b")
+    assert embedder.embedded == [("a", None), ("b", None), ("c", None), ("b", None)]
+
+
+def test_float16_round_trip_returns_plain_lists():
+    embedder = FakeEmbedder()
+    cache = EmbeddingCache(embedder)
+    first = cache.embed("hello")
+    cached = cache.embed("hello")
+    many = cache.embed_many(["hello", "world"])
+    for vector in (first, cached, *many):
+        assert type(vector) is list
+        assert all(type(x) is float for x in vector)
+    assert cached == pytest.approx(fake_vector("hello"), rel=1e-3)
+    assert many[0] == cached